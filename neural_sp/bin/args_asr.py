@@ -51,6 +51,9 @@ def parse_args_train(input_args):
         if k not in config:
             config[k] = v
 
+    if config.train_dtype == 'bfloat16':
+        parser.error('--train_dtype bfloat16 is supported only for LM training')
+
     return config
 
 
@@ -331,6 +334,8 @@ def build_parser():
     parser.add_argument('--recog_metric', type=str, default='edit_distance',
                         choices=['edit_distance', 'loss', 'accuracy', 'ppl', 'bleu'],
                         help='metric for evaluation')
+    parser.add_argument('--recog_n_jobs', type=int, default=1,
+                        help='number of processes to compute edit distance in word-level evaluation only')
     parser.add_argument('--recog_oracle', type=strtobool, default=False,
                         help='recognize by teacher-forcing')
     parser.add_argument('--recog_beam_width', type=int, default=1,
@@ -18,7 +18,7 @@ def add_args_common(parser):
     parser.add_argument('--cudnn_deterministic', type=strtobool, default=False,
                         help='use CuDNN deterministic mode')
     parser.add_argument("--train_dtype", default="float32",
-                        choices=["float16", "float32", "float64", "O0", "O1", "O2", "O3"],
+                        choices=["float16", "float32", "float64", "bfloat16", "O0", "O1", "O2", "O3"],
                         help="Data type for training")
     parser.add_argument('--model_save_dir', type=str, default=False,
                         help='directory to save a model')
@@ -96,6 +96,16 @@ def build_parser():
     # optimization
     parser.add_argument('--bptt', type=int, default=200,
                         help='BPTT length')
+    parser.add_argument('--compile', type=strtobool, default=False,
+                        help='compile the decoding graph with torch.compile (torch>=2.0)')
+    parser.add_argument('--allow_tf32', type=strtobool, default=False,
+                        help='use TensorFloat-32 tensor cores for FP32 matmul/convolution (Ampere or later). '
+                        'Ignored with --cudnn_deterministic.')
+    parser.add_argument('--eval_batch_size', type=int, default=1,
+                        help='batch size for evaluating perplexity during training. '
+                        'The corpus is split into this number of streams, so tail tokens are dropped.')
+    parser.add_argument('--plot_attention', type=strtobool, default=False,
+                        help='save attention weights of the last mini-batch together with learning curves')
     # initialization
     parser.add_argument('--pretrained_model', type=str, default=False, nargs='?',
                         help='')
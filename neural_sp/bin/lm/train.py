@@ -6,6 +6,7 @@
 
 """Train LM."""
 
+from contextlib import nullcontext
 from distutils.version import LooseVersion
 import logging
 import os
@@ -27,7 +28,10 @@ from neural_sp.bin.train_utils import (
     set_logger,
     set_save_path
 )
-from neural_sp.datasets.lm import Dataset
+from neural_sp.datasets.lm import (
+    CUDAPrefetcher,
+    Dataset
+)
 from neural_sp.datasets.utils import count_vocab_size
 from neural_sp.evaluators.ppl import eval_ppl
 from neural_sp.models.data_parallel import (
@@ -71,12 +75,7 @@ def main(args):
                       bptt=args.bptt,
                       backward=args.backward,
                       serialize=args.serialize)
-    eval_sets = [Dataset(corpus=args.corpus,
-                         tsv_path=s,
-                         batch_size=1,
-                         bptt=args.bptt,
-                         backward=args.backward,
-                         serialize=args.serialize) for s in args.eval_sets]
+    eval_sets = None  # loaded at the first evaluation
     args.vocab = count_vocab_size(args.dict)
 
     # Set save path
@@ -96,6 +95,18 @@ def main(args):
 
     # Model setting
     model = build_lm(args, args.save_path)
+    if args.compile:
+        if hasattr(torch, 'compile'):
+            # NOTE: only the decoding graph is compiled while loss and accuracy stay in eager mode.
+            # Shapes are kept static because recompiling TransformerXL with dynamic shapes once
+            # the memory is filled fails. The few other lengths (the last mini-batch, evaluation)
+            # are compiled separately.
+            # CUDA graphs (mode='reduce-overhead') are not used because they reuse output buffers,
+            # which would be overwritten while the RNNLM state or TransformerXL memory carried over
+            # to the next mini-batch still refer to them.
+            model.decode = torch.compile(model.decode, dynamic=False)
+        else:
+            logger.warning('torch.compile is not supported in torch %s.' % torch.__version__)
 
     if not args.resume:
         # Save nlsyms, dictionary, and wp_model
@@ -147,8 +158,16 @@ def main(args):
 
     # GPU setting
     args.use_apex = args.train_dtype in ["O0", "O1", "O2", "O3"]
+    args.use_bf16 = args.train_dtype == 'bfloat16'
     amp, scaler = None, None
     if args.n_gpus >= 1:
+        if args.allow_tf32 and not args.cudnn_deterministic:
+            if LooseVersion(torch.__version__) >= LooseVersion("1.7.0"):
+                # use TensorFloat-32 tensor cores for FP32 matmul/convolution on Ampere or later
+                torch.backends.cuda.matmul.allow_tf32 = True
+                torch.backends.cudnn.allow_tf32 = True
+            else:
+                logger.warning('TensorFloat-32 is not supported in torch %s.' % torch.__version__)
         model.cudnn_setting(deterministic=((not is_transformer) and (not args.cudnn_benchmark)) or args.cudnn_deterministic,
                             benchmark=(not is_transformer) and args.cudnn_benchmark)
 
@@ -163,6 +182,11 @@ def main(args):
                 amp.init()
                 if args.resume:
                     load_checkpoint(args.resume, amp=amp)
+        elif args.use_bf16:
+            # NOTE: parameters and optimizer states are kept in FP32, and loss scaling is not necessary
+            if LooseVersion(torch.__version__) < LooseVersion("1.10.0") or not torch.cuda.is_bf16_supported():
+                logger.warning('BF16 autocast is not supported. Training is performed in FP32.')
+                args.use_bf16 = False
 
         n = torch.cuda.device_count() // args.local_world_size
         device_ids = list(range(args.local_rank * n, (args.local_rank + 1) * n))
@@ -170,12 +194,18 @@ def main(args):
         torch.cuda.set_device(device_ids[0])
         model.cuda(device_ids[0])
         scheduler.cuda(device_ids[0])
+        train_set = CUDAPrefetcher(train_set, device_ids[0])
         if args.distributed:
-            model = DDP(model, device_ids=device_ids)
+            if LooseVersion(torch.__version__) >= LooseVersion("1.7.0"):
+                # gradients share memory with all-reduce buckets to avoid extra copies
+                model = DDP(model, device_ids=device_ids, gradient_as_bucket_view=True)
+            else:
+                model = DDP(model, device_ids=device_ids)
         else:
             model = CustomDataParallel(model, device_ids=list(range(args.n_gpus)))
     else:
         model = CPUWrapperLM(model)
+        args.use_bf16 = False
 
     # Set process name
     logger.info('PID: %s' % os.getpid())
@@ -215,7 +245,7 @@ def main(args):
             # dev
             model.module.reset_length(args.bptt)
             ppl_dev, _ = eval_ppl([model.module], dev_set,
-                                  batch_size=1, bptt=args.bptt)
+                                  batch_size=args.eval_batch_size, bptt=args.bptt)
             model.module.reset_length(args.bptt)
             scheduler.epoch(ppl_dev)  # lr decay
             reporter.epoch(ppl_dev, name='perplexity')  # plot
@@ -231,11 +261,18 @@ def main(args):
                         remove_old=(not is_transformer) and args.remove_old_checkpoints)
 
                 # test
+                if eval_sets is None:
+                    eval_sets = [Dataset(corpus=args.corpus,
+                                         tsv_path=s,
+                                         batch_size=args.eval_batch_size,
+                                         bptt=args.bptt,
+                                         backward=args.backward,
+                                         serialize=args.serialize) for s in args.eval_sets]
                 ppl_test_avg = 0.
                 for eval_set in eval_sets:
                     model.module.reset_length(args.bptt)
                     ppl_test, _ = eval_ppl([model.module], eval_set,
-                                           batch_size=1, bptt=args.bptt)
+                                           batch_size=args.eval_batch_size, bptt=args.bptt)
                     model.module.reset_length(args.bptt)
                     logger.info('PPL (%s, ep:%d): %.2f' %
                                 (eval_set.set, reporter.n_epochs, ppl_test))
@@ -268,7 +305,9 @@ def train_one_epoch(model, train_set, dev_set,
                     scheduler, reporter, logger, args, amp, scaler):
     """Train model for one epoch."""
     if args.local_rank == 0:
-        pbar_epoch = tqdm(total=len(train_set))
+        # NOTE: throttle redraws of the progressbar on the hot loop
+        pbar_epoch = tqdm(total=len(train_set), mininterval=5.0)
+        n_tokens_pbar = 0  # flushed to the progressbar every print_step
     num_replicas = args.local_world_size
     accum_grad_n_steps = max(1, args.accum_grad_n_steps // num_replicas)
     print_step = args.print_step // num_replicas
@@ -287,31 +326,40 @@ def train_one_epoch(model, train_set, dev_set,
         reporter.add_scalar('learning_rate', scheduler.lr)
         if _accum_n_steps == 1:
             loss_train = 0  # moving average over gradient accumulation
-        if args.use_apex and scaler is not None:
-            with torch.cuda.amp.autocast():
+        # Skip all-reduce of gradients except for the last micro-batch of gradient accumulation
+        is_update_step = _accum_n_steps >= accum_grad_n_steps or is_new_epoch
+        with model.no_sync() if args.distributed and not is_update_step else nullcontext():
+            if args.use_apex and scaler is not None:
+                with torch.cuda.amp.autocast():
+                    loss, hidden, observation = model(ys_train, state=hidden)
+            elif args.use_bf16:
+                with torch.cuda.amp.autocast(dtype=torch.bfloat16):
+                    loss, hidden, observation = model(ys_train, state=hidden)
+                # NOTE: hidden states carried over to the next mini-batch are also in BF16
+            else:
                 loss, hidden, observation = model(ys_train, state=hidden)
-        else:
-            loss, hidden, observation = model(ys_train, state=hidden)
-        reporter.add_observation(observation)
-        if args.distributed:
-            loss *= num_replicas
-        loss /= accum_grad_n_steps
-
-        if args.use_apex:
-            if scaler is not None:
-                scaler.scale(loss).backward()
+            reporter.add_observation(observation)
+            if args.distributed:
+                loss *= num_replicas
+            loss /= accum_grad_n_steps
+
+            if args.use_apex:
+                if scaler is not None:
+                    scaler.scale(loss).backward()
+                else:
+                    with amp.scale_loss(loss, scheduler.optimizer) as scaled_loss:
+                        scaled_loss.backward()
             else:
-                with amp.scale_loss(loss, scheduler.optimizer) as scaled_loss:
-                    scaled_loss.backward()
-        else:
-            loss.backward()
+                loss.backward()
 
         loss.detach()  # Truncate the graph
         loss_train += loss.item()
         del loss
 
-        if _accum_n_steps >= accum_grad_n_steps or is_new_epoch:
+        if is_update_step:
             if args.clip_grad_norm > 0:
+                if args.use_apex and scaler is not None:
+                    scaler.unscale_(scheduler.optimizer)  # clip unscaled gradients
                 total_norm = torch.nn.utils.clip_grad_norm_(
                     model.module.parameters(), args.clip_grad_norm)
                 reporter.add_scalar('total_norm', total_norm)
@@ -329,9 +377,11 @@ def train_one_epoch(model, train_set, dev_set,
         hidden = model.module.repackage_state(hidden)
 
         if args.local_rank == 0:
-            pbar_epoch.update(num_samples * (len(ys_train[0]) - 1))
-            if is_new_epoch:
-                pbar_epoch.update(num_samples)  # for the last <eos>
+            # the last <eos> is counted at the end of epoch
+            n_tokens_pbar += num_samples * (len(ys_train[0]) - 1 + int(is_new_epoch))
+            if is_new_epoch or (reporter.n_steps > 0 and reporter.n_steps % print_step == 0):
+                pbar_epoch.update(n_tokens_pbar)
+                n_tokens_pbar = 0
 
         if reporter.n_steps > 0 and reporter.n_steps % print_step == 0:
             # Compute loss in the dev set
@@ -354,7 +404,8 @@ def train_one_epoch(model, train_set, dev_set,
         # Save figures of loss and accuracy
         if args.local_rank == 0 and reporter.n_steps > 0 and reporter.n_steps % (print_step * 10) == 0:
             reporter.snapshot()
-            model.module.plot_attention()
+            if args.plot_attention:
+                model.module.plot_attention()
 
         if is_new_epoch:
             break
@@ -190,7 +190,7 @@ def set_lm_name(args):
     else:
         dir_name += '_lr' + str(args.lr)
     dir_name += '_bs' + str(args.batch_size)
-    if args.train_dtype in ["O0", "O1", "O2", "O3"]:
+    if args.train_dtype in ["O0", "O1", "O2", "O3", "bfloat16"]:
         dir_name += '_' + args.train_dtype
 
     dir_name += '_bptt' + str(args.bptt)
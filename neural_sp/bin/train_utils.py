@@ -128,6 +128,57 @@ def set_save_path(save_path):
     return save_path_new
 
 
+def merge_optimizer_state(optimizer_state_dict, model, model_state_dict):
+    """Remap optimizer states saved before attention projections were stacked.
+
+    Checkpoints saved with separate w_query/w_key/w_value have one optimizer
+    state per projection. They are concatenated in the same order as the
+    parameters so that optimization resumes with the stacked projections.
+
+    Args:
+        optimizer_state_dict (dict): state dict of torch.optim.Optimizer in the checkpoint
+        model (torch.nn.Module): model to be resumed
+        model_state_dict (dict): state dict of the model in the checkpoint
+
+    """
+    buffer_names = set(n for n, _ in model.named_buffers())
+    frozen_names = set(n for n, p in model.named_parameters() if not p.requires_grad)
+    param_names = [n for n, p in model.named_parameters() if p.requires_grad]
+    param_names_old = [n for n in model_state_dict.keys()
+                       if n not in buffer_names and n not in frozen_names]
+    if param_names_old == param_names:
+        return
+    if len(optimizer_state_dict['param_groups']) != 1:
+        raise ValueError('Optimizer state with %d parameter groups cannot be remapped.' %
+                         len(optimizer_state_dict['param_groups']))
+
+    # Stack indices of the saved states in the same way as parameters
+    indices = {n: torch.tensor([i]) for i, n in enumerate(param_names_old)}
+    for name, module in model.named_modules():
+        if hasattr(module, 'merge_projections'):
+            module.merge_projections(indices, name + '.' if name else '')
+    if any(n not in indices for n in param_names):
+        raise ValueError('Optimizer state does not match the model parameters: %s' %
+                         [n for n in param_names if n not in indices])
+
+    states = optimizer_state_dict['state']
+    states_new = {}
+    for i, n in enumerate(param_names):
+        states_i = [states[j] for j in indices[n].tolist() if j in states]
+        if len(states_i) < len(indices[n]):
+            # NOTE: start over if some projections have not been updated yet
+            continue
+        states_new[i] = {}
+        for k, v in states_i[0].items():
+            if torch.is_tensor(v) and v.dim() > 0:
+                states_new[i][k] = torch.cat([s[k] for s in states_i], dim=0)
+            else:
+                states_new[i][k] = v  # e.g. step
+    optimizer_state_dict['state'] = states_new
+    optimizer_state_dict['param_groups'][0]['params'] = list(range(len(param_names)))
+    logger.info('=> Merged optimizer states of separate attention projections')
+
+
 def load_checkpoint(checkpoint_path, model=None, scheduler=None, amp=None):
     """Load checkpoint.
 
@@ -156,6 +207,9 @@ def load_checkpoint(checkpoint_path, model=None, scheduler=None, amp=None):
 
     # Restore scheduler/optimizer
     if scheduler is not None:
+        if model is not None:
+            merge_optimizer_state(checkpoint['optimizer_state_dict']['optimizer_state_dict'],
+                                  model, checkpoint['model_state_dict'])
         scheduler.load_state_dict(checkpoint['optimizer_state_dict'])
         # NOTE: fix this later
         scheduler.optimizer.param_groups[0]['params'] = []
@@ -11,6 +11,7 @@ import numpy as np
 import os
 import pandas as pd
 import random
+import torch
 import torch.distributed as dist
 
 random.seed(1)
@@ -91,6 +92,12 @@ class Dataset(object):
         else:
             self.df = self.df.sort_values(by='utt_id', ascending=True)
 
+        # Parse token IDs only once since utterances are just reordered at every reset
+        self.token_ids = {}
+        for i, token_id in zip(self.df.index, self.df['token_id']):
+            assert token_id != ''
+            self.token_ids[i] = np.array([self.eos] + list(map(int, token_id.split())), dtype=np.int64)
+
         # Concatenate into a single sentence
         self.concat_ids = self.concat_utterances(self.df)
 
@@ -100,11 +107,7 @@ class Dataset(object):
         indices = list(df.index)
         if self.backward:
             indices = indices[::-1]
-        concat_ids = []
-        for i in indices:
-            assert df['token_id'][i] != ''
-            concat_ids += [self.eos] + list(map(int, df['token_id'][i].split()))
-        concat_ids += [self.eos]  # for the last sentence
+        concat_ids = np.concatenate([self.token_ids[i] for i in indices] + [[self.eos]])  # for the last sentence
         # NOTE: <sos> and <eos> have the same index
 
         # Reshape
@@ -112,7 +115,7 @@ class Dataset(object):
         n_utts = len(concat_ids) // (batch_size * self.num_replicas) * batch_size * self.num_replicas
         concat_ids = concat_ids[:n_utts]
         logger.debug(f"Removed {n_utts_org - len(concat_ids)} tokens / {n_utts_org} tokens")
-        concat_ids = np.array(concat_ids).reshape((self.num_replicas, batch_size, -1))
+        concat_ids = concat_ids.reshape((self.num_replicas, batch_size, -1))
 
         return concat_ids
 
@@ -139,7 +142,7 @@ class Dataset(object):
         self.offset = 0
 
     def __len__(self):
-        return len(self.concat_ids.reshape((-1,)))
+        return self.concat_ids.size
 
     def __iter__(self):
         """Generate each mini-batch.
@@ -167,3 +170,60 @@ class Dataset(object):
             self.epoch += 1
 
         return ys, is_new_epoch
+
+
+class CUDAPrefetcher(object):
+
+    def __init__(self, dataset, device):
+        """A wrapper of Dataset to overlap host-to-device copy with computation.
+           The next mini-batch is copied from pinned memory on a side CUDA stream
+           while the current one is being processed.
+
+        Args:
+            dataset (Dataset): dataset to wrap
+            device (int or torch.device): GPU to copy mini-batches to
+
+        """
+        self.dataset = dataset
+        self.device = torch.device('cuda', device) if isinstance(device, int) else device
+        self.stream = torch.cuda.Stream(device=self.device)
+        self.next_batch = None  # at most one mini-batch is prefetched
+        self._epoch_detail = dataset.epoch_detail
+
+    @property
+    def epoch_detail(self):
+        """Percentage of the current epoch."""
+        return self._epoch_detail
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return self.__next__()
+
+    def _preload(self):
+        ys, is_new_epoch = self.dataset.next()
+        epoch_detail = self.dataset.epoch_detail
+        ys_pin = torch.empty(ys.shape, dtype=torch.int64, pin_memory=True)
+        ys_pin.copy_(torch.from_numpy(ys))
+        with torch.cuda.stream(self.stream):
+            ys = ys_pin.to(self.device, non_blocking=True)
+        self.next_batch = (ys, is_new_epoch, epoch_detail)
+
+    def __next__(self):
+        if self.next_batch is None:
+            self._preload()
+        current_stream = torch.cuda.current_stream(self.device)
+        current_stream.wait_stream(self.stream)
+        ys, is_new_epoch, self._epoch_detail = self.next_batch
+        ys.record_stream(current_stream)
+        self.next_batch = None
+
+        # NOTE: do not prefetch across epochs
+        if not is_new_epoch:
+            self._preload()
+
+        return ys, is_new_epoch
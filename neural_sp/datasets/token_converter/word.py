@@ -4,6 +4,7 @@
 """Word-level token <-> index converter."""
 
 import codecs
+import numpy as np
 
 
 class Word2idx(object):
@@ -86,7 +87,9 @@ class Idx2word(object):
             words (list): list of words
 
         """
-        words = list(map(lambda w: self.idx2token[w], token_ids))
+        if isinstance(token_ids, np.ndarray):
+            token_ids = token_ids.tolist()  # Python int is faster to hash than np.int64
+        words = list(map(self.idx2token.__getitem__, token_ids))
         if return_list:
             return words
         return ' '.join(words)
@@ -165,7 +165,7 @@ def eval_char(models, dataloader, params, epoch=-1, rank=0,
                                         for hyp_n in nbest_hyps[1:]]
                     oracle_idx = np.argmin(np.array(cers_b))
                     if oracle_idx == 0:
-                        n_oracle_hit += len(batch['utt_ids'])
+                        n_oracle_hit += 1
                     cer_oracle += cers_b[oracle_idx]
 
                 if fine_grained:
@@ -53,6 +53,76 @@ def compute_cer(ref, hyp, normalize=False):
     return cer * 100
 
 
+def _count_edit_ops(ref, hyp, d):
+    """Fill the Levenshtein distance matrix and count errors along the backtrace.
+
+    Args:
+        ref (list or np.ndarray): tokens in the reference transcript
+        hyp (list or np.ndarray): tokens in the predicted transcript
+        d (list or np.ndarray): buffer of size `[len(ref) + 1, len(hyp) + 1]`
+    Returns:
+        n_err (int): edit distance between ref and hyp
+        n_sub (int): the number of substitution
+        n_ins (int): the number of insertion
+        n_del (int): the number of deletion
+
+    """
+    n_ref = len(ref)
+    n_hyp = len(hyp)
+
+    # Initialisation
+    for i in range(n_ref + 1):
+        d[i][0] = i
+    for j in range(n_hyp + 1):
+        d[0][j] = j
+
+    # Computation
+    for i in range(1, n_ref + 1):
+        d_prev = d[i - 1]
+        d_cur = d[i]
+        r = ref[i - 1]
+        for j in range(1, n_hyp + 1):
+            if r == hyp[j - 1]:
+                d_cur[j] = d_prev[j - 1]
+            else:
+                d_cur[j] = min(d_prev[j - 1], d_cur[j - 1], d_prev[j]) + 1
+
+    # Find out the manipulation steps (correct > insertion > substitution > deletion)
+    x = n_ref
+    y = n_hyp
+    n_sub, n_ins, n_del = 0, 0, 0
+    while x > 0 or y > 0:
+        if x > 0 and y > 0:
+            if d[x][y] == d[x - 1][y - 1] and ref[x - 1] == hyp[y - 1]:
+                x -= 1
+                y -= 1
+            elif d[x][y] == d[x][y - 1] + 1:
+                n_ins += 1
+                y -= 1
+            elif d[x][y] == d[x - 1][y - 1] + 1:
+                n_sub += 1
+                x -= 1
+                y -= 1
+            else:
+                n_del += 1
+                x -= 1
+        elif x == 0:
+            n_ins += 1
+            y -= 1
+        else:
+            n_del += 1
+            x -= 1
+
+    return d[n_ref][n_hyp], n_sub, n_ins, n_del
+
+
+try:
+    from numba import njit
+    _count_edit_ops_nb = njit(cache=True)(_count_edit_ops)
+except ImportError:
+    _count_edit_ops_nb = None
+
+
 def compute_wer(ref, hyp, normalize=False):
     """Compute Word Error Rate.
 
@@ -69,77 +139,44 @@ def compute_wer(ref, hyp, normalize=False):
         n_del (int): the number of deletion
 
     """
-    # Initialisation
-    d = np.zeros((len(ref) + 1) * (len(hyp) + 1), dtype=np.uint16)
-    d = d.reshape((len(ref) + 1, len(hyp) + 1))
-    for i in range(len(ref) + 1):
-        for j in range(len(hyp) + 1):
-            if i == 0:
-                d[0][j] = j
-            elif j == 0:
-                d[i][0] = i
+    return compute_wers([ref], [hyp], normalize)[0]
 
-    # Computation
-    for i in range(1, len(ref) + 1):
-        for j in range(1, len(hyp) + 1):
-            if ref[i - 1] == hyp[j - 1]:
-                d[i][j] = d[i - 1][j - 1]
-            else:
-                sub_tmp = d[i - 1][j - 1] + 1
-                ins_tmp = d[i][j - 1] + 1
-                del_tmp = d[i - 1][j] + 1
-                d[i][j] = min(sub_tmp, ins_tmp, del_tmp)
 
-    wer = d[len(ref)][len(hyp)]
+def compute_wers(refs, hyps, normalize=False):
+    """Compute Word Error Rate for a batch of utterances.
 
-    # Find out the manipulation steps
-    x = len(ref)
-    y = len(hyp)
-    error_list = []
-    while True:
-        if x == 0 and y == 0:
-            break
-        else:
-            if x > 0 and y > 0:
-                if d[x][y] == d[x - 1][y - 1] and ref[x - 1] == hyp[y - 1]:
-                    error_list.append("C")
-                    x = x - 1
-                    y = y - 1
-                elif d[x][y] == d[x][y - 1] + 1:
-                    error_list.append("I")
-                    y = y - 1
-                elif d[x][y] == d[x - 1][y - 1] + 1:
-                    error_list.append("S")
-                    x = x - 1
-                    y = y - 1
-                else:
-                    error_list.append("D")
-                    x = x - 1
-            elif x == 0 and y > 0:
-                if d[x][y] == d[x][y - 1] + 1:
-                    error_list.append("I")
-                    y = y - 1
-                else:
-                    error_list.append("D")
-                    x = x - 1
-            elif y == 0 and x > 0:
-                error_list.append("D")
-                x = x - 1
-            else:
-                raise ValueError
+    Args:
+        refs (List): length `B`, each of which contains words in the reference transcript
+        hyps (List): length `B`, each of which contains words in the predicted transcript
+        normalize (bool, optional): if True, divide by the length of each ref
+    Returns:
+        results (List): length `B`, each of which is a tuple of
+            (wer, n_sub, n_ins, n_del) as returned by `compute_wer`
 
-    n_sub = error_list.count("S")
-    n_ins = error_list.count("I")
-    n_del = error_list.count("D")
-    n_cor = error_list.count("C")
+    """
+    assert len(refs) == len(hyps)
+    results = []
+    vocab = {}  # shared in the batch
+    for ref, hyp in zip(refs, hyps):
+        if _count_edit_ops_nb is not None:
+            # Map tokens to IDs for the JIT-compiled kernel
+            ref_ids = np.array([vocab.setdefault(w, len(vocab)) for w in ref], dtype=np.int32)
+            hyp_ids = np.array([vocab.setdefault(w, len(vocab)) for w in hyp], dtype=np.int32)
+            d = np.zeros((len(ref) + 1, len(hyp) + 1), dtype=np.int32)
+            wer, n_sub, n_ins, n_del = _count_edit_ops_nb(ref_ids, hyp_ids, d)
+            wer, n_sub, n_ins, n_del = int(wer), int(n_sub), int(n_ins), int(n_del)
+        else:
+            # NOTE: indexing Python lists is much faster than indexing np.ndarray element-wise
+            d = [[0] * (len(hyp) + 1) for _ in range(len(ref) + 1)]
+            wer, n_sub, n_ins, n_del = _count_edit_ops(ref, hyp, d)
 
-    assert wer == (n_sub + n_ins + n_del)
-    assert n_cor == (len(ref) - n_sub - n_del)
+        assert wer == (n_sub + n_ins + n_del)
 
-    if normalize:
-        wer /= len(ref)
+        if normalize:
+            wer /= len(ref)
 
-    return wer * 100, n_sub * 100, n_ins * 100, n_del * 100
+        results.append((wer * 100, n_sub * 100, n_ins * 100, n_del * 100))
+    return results
 
 
 def wer_align(ref, hyp, normalize=False, double_byte=False):
@@ -123,7 +123,7 @@ def eval_phone(models, dataloader, params, epoch=-1, rank=0,
                                         for hyp_n in nbest_hyps[1:]]
                     oracle_idx = np.argmin(np.array(pers_b))
                     if oracle_idx == 0:
-                        n_oracle_hit += len(batch['utt_ids'])
+                        n_oracle_hit += 1
                     per_oracle += pers_b[oracle_idx]
 
         n_utt += len(batch['utt_ids'])
@@ -3,13 +3,22 @@
 
 """Evaluate word-level model by WER."""
 
-import codecs
+from collections import (
+    defaultdict,
+    deque
+)
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 import copy
 import logging
+import multiprocessing
 import numpy as np
 from tqdm import tqdm
 
-from neural_sp.evaluators.edit_distance import compute_wer
+from neural_sp.evaluators.edit_distance import (
+    compute_wer,
+    compute_wers
+)
 from neural_sp.evaluators.resolving_unk import resolve_unk
 from neural_sp.utils import mkdir_join
 
@@ -40,15 +49,18 @@ def eval_word(models, dataloader, params, epoch=-1, rank=0,
         cer (float): Character error rate
         n_oov_total (int): total number of OOV
 
+    NOTE: If `dataloader.idx2token[0]` has an attribute `batched=True`, it is
+    called once per mini-batch with a list of token id sequences and must return
+    a list of strings in the same order (i.e., `idx2token(List[List[int]]) -> List[str]`).
+    Models are given a wrapper converting one sequence at a time instead.
+
     """
     if save_dir is None:
-        save_dir = 'decode_' + dataloader.set + '_ep' + \
-            str(epoch) + '_beam' + str(params.get('recog_beam_width'))
-        save_dir += '_lp' + str(params.get('recog_length_penalty'))
-        save_dir += '_cp' + str(params.get('recog_coverage_penalty'))
-        save_dir += '_' + str(params.get('recog_min_len_ratio')) + '_' + \
-            str(params.get('recog_max_len_ratio'))
-        save_dir += '_lm' + str(params.get('recog_lm_weight'))
+        save_dir = f"decode_{dataloader.set}_ep{epoch}_beam{params.get('recog_beam_width')}"
+        save_dir += f"_lp{params.get('recog_length_penalty')}"
+        save_dir += f"_cp{params.get('recog_coverage_penalty')}"
+        save_dir += f"_{params.get('recog_min_len_ratio')}_{params.get('recog_max_len_ratio')}"
+        save_dir += f"_lm{params.get('recog_lm_weight')}"
 
         ref_trn_path = mkdir_join(models[0].save_path, save_dir, 'ref.trn', rank=rank)
         hyp_trn_path = mkdir_join(models[0].save_path, save_dir, 'hyp.trn', rank=rank)
@@ -60,7 +72,7 @@ def eval_word(models, dataloader, params, epoch=-1, rank=0,
     n_sub_w, n_ins_w, n_del_w = 0, 0, 0
     n_sub_c, n_ins_c, n_del_c = 0, 0, 0
     n_word, n_char = 0, 0
-    wer_dist = {}  # calculate WER distribution based on input lengths
+    wer_dist = defaultdict(lambda: [0, 0])  # calculate WER distribution based on input lengths (sum, count)
     n_oov_total = 0
 
     wer_oracle = 0
@@ -70,119 +82,213 @@ def eval_word(models, dataloader, params, epoch=-1, rank=0,
     # Reset data counter
     dataloader.reset(params.get('recog_batch_size'), 'seq')
 
+    n_utt_total = len(dataloader)
     if progressbar:
-        pbar = tqdm(total=len(dataloader))
+        pbar = tqdm(total=n_utt_total, mininterval=0.5,
+                    miniters=max(1, n_utt_total // 200), dynamic_ncols=True)
+
+    if params.get('recog_resolving_unk'):
+        # greedy decoding without LM for the character-level decoder
+        recog_params_char = copy.deepcopy(params)
+        recog_params_char['recog_lm_weight'] = 0
+        recog_params_char['recog_beam_width'] = 1
+        subsample_factor_word = int(np.prod(models[0].subsample))
+        subsample_factor_char = int(np.prod(models[0].subsample[:models[0].enc_n_layers_sub1 - 1]))
+
+    # Hoist lookups out of the mini-batch loop
+    block_sync = params.get('recog_block_sync')
+    resolving_unk = params.get('recog_resolving_unk')
+    corpus = dataloader.corpus
+    idx2token = dataloader.idx2token[0]
+    idx2char = dataloader.idx2token[1] if len(dataloader.idx2token) > 1 else None  # for OOV resolution
+    decode = models[0].decode
+    batched_idx2token = getattr(idx2token, 'batched', False)
+    idx2token_seq = idx2token  # for models, which convert one sequence at a time
+    if batched_idx2token:
+        def idx2token_seq(token_ids):
+            return idx2token([token_ids])[0]
+
+    # NOTE: skip formatting debug messages per utterance
+    is_debug = logger.isEnabledFor(logging.DEBUG)
 
     if rank == 0:
-        f_hyp = codecs.open(hyp_trn_path, 'w', encoding='utf-8')
-        f_ref = codecs.open(ref_trn_path, 'w', encoding='utf-8')
-
-    for batch in dataloader:
-        speakers = batch['sessions' if dataloader.corpus == 'swbd' else 'speakers']
-        if streaming or params.get('recog_block_sync'):
-            nbest_hyps_id = models[0].decode_streaming(
-                batch['xs'], params, dataloader.idx2token[0],
-                exclude_eos=True,
-                speaker=speakers[0])[0]
-        else:
-            nbest_hyps_id, aws = models[0].decode(
-                batch['xs'], params,
-                idx2token=dataloader.idx2token[0],
-                exclude_eos=True,
-                refs_id=batch['ys'],
-                utt_ids=batch['utt_ids'],
-                speakers=speakers,
-                ensemble_models=models[1:] if len(models) > 1 else [],
-                teacher_force=teacher_force)
-
-        for b in range(len(batch['xs'])):
-            ref = batch['text'][b]
-            nbest_hyps = [dataloader.idx2token[0](hyp_id) for hyp_id in nbest_hyps_id[b]]
-            n_oov_total += nbest_hyps[0].count('<unk>')
-
-            # Resolving UNK
-            if params.get('recog_resolving_unk') and '<unk>' in nbest_hyps[0]:
-                recog_params_char = copy.deepcopy(params)
-                recog_params_char['recog_lm_weight'] = 0
-                recog_params_char['recog_beam_width'] = 1
-                best_hyps_id_char, aw_char = models[0].decode(
-                    batch['xs'][b:b + 1], recog_params_char,
-                    idx2token=dataloader.idx2token[1],
+        f_hyp = open(hyp_trn_path, 'w', encoding='utf-8')
+        f_ref = open(ref_trn_path, 'w', encoding='utf-8')
+
+    # Compute edit distance in parallel with multiple processes
+    # NOTE: WER of each mini-batch is computed in the background while decoding the following ones
+    n_jobs = params.get('recog_n_jobs')
+    use_pool = edit_distance and not streaming and n_jobs is not None and n_jobs > 1
+    n_pending_max = 2 * n_jobs if use_pool else 0  # bound the number of mini-batches kept in memory
+    wer_batches = deque()  # (results or future, refs, n-best hypotheses, input lengths) per mini-batch
+
+    def accumulate(results, refs, nbest_hyps_w, xlens):
+        """Accumulate edit distance of a mini-batch."""
+        nonlocal wer, n_sub_w, n_ins_w, n_del_w, n_word, wer_oracle, n_oracle_hit
+        if use_pool:
+            results = results.result()
+        for b, (err_b, sub_b, ins_b, del_b) in enumerate(results):
+            ref_words = refs[b]
+            nbest_hyps = nbest_hyps_w[b]
+            wer += err_b
+            n_sub_w += sub_b
+            n_ins_w += ins_b
+            n_del_w += del_b
+            n_word += len(ref_words)
+
+            # Compute oracle WER
+            if oracle and len(nbest_hyps) > 1:
+                wers_b = [err_b]
+                wers_b.extend(compute_wer(ref=ref_words, hyp=hyp_n.split(' '))[0]
+                              for hyp_n in nbest_hyps[1:])
+                wer_oracle_b = min(wers_b)
+                oracle_idx = wers_b.index(wer_oracle_b)
+                if oracle_idx == 0:
+                    n_oracle_hit += 1
+                wer_oracle += wer_oracle_b
+                # NOTE: OOV resolution is not considered
+
+            if fine_grained:
+                xlen_bin = int(xlens[b]) // 200 * 200 + 200  # Python int as a dict key
+                wer_dist[xlen_bin][0] += err_b / 100
+                wer_dist[xlen_bin][1] += 1
+
+    pool = nullcontext()
+    if use_pool:
+        pool = ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'))
+    with pool as executor:
+        for batch in dataloader:
+            speakers = batch['sessions' if corpus == 'swbd' else 'speakers']
+            if streaming or block_sync:
+                nbest_hyps_id = models[0].decode_streaming(
+                    batch['xs'], params, idx2token_seq,
                     exclude_eos=True,
-                    refs_id=batch['ys_sub1'],
+                    speaker=speakers[0])[0]
+            else:
+                nbest_hyps_id, aws = decode(
+                    batch['xs'], params,
+                    idx2token=idx2token_seq,
+                    exclude_eos=True,
+                    refs_id=batch['ys'],
                     utt_ids=batch['utt_ids'],
                     speakers=speakers,
+                    ensemble_models=models[1:] if len(models) > 1 else [],
+                    teacher_force=teacher_force)
+
+            B = len(batch['utt_ids'])
+            nbest_hyps_b = []
+            # the other hypotheses than the best one are used only for oracle WER
+            use_nbest = oracle and edit_distance and not streaming
+            if batched_idx2token:
+                # convert all hypotheses in the mini-batch at once
+                hyps_id = [h for b in range(B) for h in (nbest_hyps_id[b] if use_nbest else nbest_hyps_id[b][:1])]
+                hyps = idx2token(hyps_id)
+                offset = 0
+                for b in range(B):
+                    n_hyps = len(nbest_hyps_id[b]) if use_nbest else 1
+                    nbest_hyps_b.append(list(hyps[offset:offset + n_hyps]))
+                    offset += n_hyps
+            else:
+                for b in range(B):
+                    nbest_hyps = [idx2token(nbest_hyps_id[b][0])]
+                    if use_nbest:
+                        nbest_hyps += [idx2token(hyp_id) for hyp_id in nbest_hyps_id[b][1:]]
+                    nbest_hyps_b.append(nbest_hyps)
+
+            # Resolving UNK
+            # NOTE: all utterances including OOV in the mini-batch are decoded at once
+            oov2idx = {}  # index in the mini-batch -> index in OOV utterances
+            for b in range(B):
+                # NOTE: count OOV only when the best hypothesis contains any
+                if '<unk>' in nbest_hyps_b[b][0]:
+                    n_oov_total += nbest_hyps_b[b][0].count('<unk>')
+                    if resolving_unk:
+                        oov2idx[b] = len(oov2idx)
+            if len(oov2idx) > 0:
+                assert not streaming
+                best_hyps_id_char, aw_char = decode(
+                    [batch['xs'][b] for b in oov2idx], recog_params_char,
+                    idx2token=idx2char,
+                    exclude_eos=True,
+                    refs_id=[batch['ys_sub1'][b] for b in oov2idx],
+                    utt_ids=[batch['utt_ids'][b] for b in oov2idx],
+                    speakers=[speakers[b] for b in oov2idx],
                     task='ys_sub1')
                 # TODO(hirofumi): support ys_sub2
 
-                assert not streaming
+            refs_w, nbest_hyps_w = [], []  # WER is computed for the whole mini-batch at once
+            lines_ref, lines_hyp = [], []  # written at once per mini-batch
+            for b in range(B):
+                ref = batch['text'][b]
+                nbest_hyps = nbest_hyps_b[b]
+
+                if b in oov2idx:
+                    i = oov2idx[b]
+                    nbest_hyps[0] = resolve_unk(
+                        nbest_hyps[0], best_hyps_id_char[i], aws[b], aw_char[i], idx2char,
+                        subsample_factor_word=subsample_factor_word,
+                        subsample_factor_char=subsample_factor_char)
+                    if is_debug:
+                        logger.debug('Hyp (after OOV resolution): %s' % nbest_hyps[0])
+                    nbest_hyps[0] = nbest_hyps[0].replace('*', '')
+
+                    # Compute CER
+                    ref_char = ref
+                    hyp_char = nbest_hyps[0]
+                    if corpus == 'csj':
+                        ref_char = ref_char.replace(' ', '')
+                        hyp_char = hyp_char.replace(' ', '')
+                    err_b, sub_b, ins_b, del_b = compute_wer(ref=list(ref_char),
+                                                             hyp=list(hyp_char))
+                    cer += err_b
+                    n_sub_c += sub_b
+                    n_ins_c += ins_b
+                    n_del_c += del_b
+                    n_char += len(ref_char)
+
+                # Write to trn
+                speaker = str(batch['speakers'][b]).replace('-', '_')
+                if streaming:
+                    utt_id = f"{batch['utt_ids'][b]}_0000000_0000001"
+                else:
+                    utt_id = str(batch['utt_ids'][b])
+                if rank == 0:
+                    lines_ref.append(f"{ref} ({speaker}-{utt_id})\n")
+                    lines_hyp.append(f"{nbest_hyps[0]} ({speaker}-{utt_id})\n")
+                if is_debug:
+                    logger.debug('utt-id (%d/%d): %s' % (n_utt + 1, n_utt_total, utt_id))
+                    logger.debug('Ref: %s' % ref)
+                    logger.debug('Hyp: %s' % nbest_hyps[0])
+                    logger.debug('-' * 150)
+
+                if edit_distance and not streaming:
+                    refs_w.append(ref)
+                    nbest_hyps_w.append(nbest_hyps)
 
-                nbest_hyps[0] = resolve_unk(
-                    nbest_hyps[0], best_hyps_id_char[0], aws[b], aw_char[0], dataloader.idx2token[1],
-                    subsample_factor_word=np.prod(models[0].subsample),
-                    subsample_factor_char=np.prod(models[0].subsample[:models[0].enc_n_layers_sub1 - 1]))
-                logger.debug('Hyp (after OOV resolution): %s' % nbest_hyps[0])
-                nbest_hyps[0] = nbest_hyps[0].replace('*', '')
-
-                # Compute CER
-                ref_char = ref
-                hyp_char = nbest_hyps[0]
-                if dataloader.corpus == 'csj':
-                    ref_char = ref_char.replace(' ', '')
-                    hyp_char = hyp_char.replace(' ', '')
-                err_b, sub_b, ins_b, del_b = compute_wer(ref=list(ref_char),
-                                                         hyp=list(hyp_char))
-                cer += err_b
-                n_sub_c += sub_b
-                n_ins_c += ins_b
-                n_del_c += del_b
-                n_char += len(ref_char)
-
-            # Write to trn
-            speaker = str(batch['speakers'][b]).replace('-', '_')
-            if streaming:
-                utt_id = str(batch['utt_ids'][b]) + '_0000000_0000001'
-            else:
-                utt_id = str(batch['utt_ids'][b])
             if rank == 0:
-                f_ref.write(ref + ' (' + speaker + '-' + utt_id + ')\n')
-                f_hyp.write(nbest_hyps[0] + ' (' + speaker + '-' + utt_id + ')\n')
-            logger.debug('utt-id (%d/%d): %s' % (n_utt + 1, len(dataloader), utt_id))
-            logger.debug('Ref: %s' % ref)
-            logger.debug('Hyp: %s' % nbest_hyps[0])
-            logger.debug('-' * 150)
+                f_ref.writelines(lines_ref)
+                f_hyp.writelines(lines_hyp)
 
             if edit_distance and not streaming:
                 # Compute WER
-                err_b, sub_b, ins_b, del_b = compute_wer(ref=ref.split(' '),
-                                                         hyp=nbest_hyps[0].split(' '))
-                wer += err_b
-                n_sub_w += sub_b
-                n_ins_w += ins_b
-                n_del_w += del_b
-                n_word += len(ref.split(' '))
-
-                # Compute oracle WER
-                if oracle and len(nbest_hyps) > 1:
-                    wers_b = [err_b] + [compute_wer(ref=ref.split(' '),
-                                                    hyp=hyp_n.split(' '))[0]
-                                        for hyp_n in nbest_hyps[1:]]
-                    oracle_idx = np.argmin(np.array(wers_b))
-                    if oracle_idx == 0:
-                        n_oracle_hit += len(batch['utt_ids'])
-                    wer_oracle += wers_b[oracle_idx]
-                    # NOTE: OOV resolution is not considered
-
-                if fine_grained:
-                    xlen_bin = (batch['xlens'][b] // 200 + 1) * 200
-                    if xlen_bin in wer_dist.keys():
-                        wer_dist[xlen_bin] += [err_b / 100]
-                    else:
-                        wer_dist[xlen_bin] = [err_b / 100]
-
-        n_utt += len(batch['utt_ids'])
-        if progressbar:
-            pbar.update(len(batch['utt_ids']))
+                refs = [ref.split(' ') for ref in refs_w]
+                hyps = [nbest_hyps[0].split(' ') for nbest_hyps in nbest_hyps_w]
+                if executor is not None:
+                    results = executor.submit(compute_wers, refs, hyps)
+                else:
+                    results = compute_wers(refs, hyps)
+                wer_batches.append((results, refs, nbest_hyps_w, batch['xlens']))
+                # Accumulate edit distance of finished mini-batches
+                while len(wer_batches) > n_pending_max:
+                    accumulate(*wer_batches.popleft())
+
+            n_utt += B
+            if progressbar:
+                pbar.update(B)
+
+        # Accumulate edit distance of the remaining mini-batches
+        while len(wer_batches) > 0:
+            accumulate(*wer_batches.popleft())
 
     if rank == 0:
         f_hyp.close()
@@ -219,7 +325,7 @@ def eval_word(models, dataloader, params, epoch=-1, rank=0,
             logger.info('Oracle hit rate (%s): %.2f %%' % (dataloader.set, oracle_hit_rate))
 
         if fine_grained:
-            for len_bin, wers in sorted(wer_dist.items(), key=lambda x: x[0]):
-                logger.info('  WER (%s): %.2f %% (%d)' % (dataloader.set, sum(wers) / len(wers), len_bin))
+            for len_bin, (wer_sum, n_utt_bin) in sorted(wer_dist.items(), key=lambda x: x[0]):
+                logger.info('  WER (%s): %.2f %% (%d)' % (dataloader.set, wer_sum / n_utt_bin, len_bin))
 
     return wer, cer, n_oov_total
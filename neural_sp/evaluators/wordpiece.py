@@ -130,7 +130,7 @@ def eval_wordpiece(models, dataloader, params, epoch=-1, rank=0,
                                         for hyp_n in nbest_hyps[1:]]
                     oracle_idx = np.argmin(np.array(wers_b))
                     if oracle_idx == 0:
-                        n_oracle_hit += len(batch['utt_ids'])
+                        n_oracle_hit += 1
                     wer_oracle += wers_b[oracle_idx]
 
                 if fine_grained:
@@ -128,7 +128,7 @@ def eval_wordpiece_bleu(models, dataloader, params, epoch=-1, rank=0,
                                  for hyp_n in nbest_hyps]
                     oracle_idx = np.argmax(np.array(s_blues_b))
                     if oracle_idx == 0:
-                        n_oracle_hit += len(batch['utt_ids'])
+                        n_oracle_hit += 1
                     hypotheses_oracle += [nbest_hyps[oracle_idx].split(' ')]
 
         n_utt += len(batch['utt_ids'])
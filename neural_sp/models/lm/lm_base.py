@@ -34,6 +34,7 @@ class LMBase(ModelBase):
 
         Args:
             ys (List): length `B`, each of which contains arrays of size `[L]`
+                (or np.ndarray/LongTensor of size `[B, L]`)
             state (tuple or List):
             is_eval (bool): if True, the history will not be saved.
                 This should be used in inference model for memory efficiency.
@@ -56,8 +57,13 @@ class LMBase(ModelBase):
         return loss, state, observation
 
     def _forward(self, ys, state, n_caches=0, predict_last=False):
-        ys = [np2tensor(y, self.device) for y in ys]  # <eos> is included
-        ys = pad_list(ys, self.pad)
+        if torch.is_tensor(ys):
+            ys = ys.to(self.device)  # already prefetched
+        elif isinstance(ys, np.ndarray) and ys.ndim == 2:
+            ys = np2tensor(ys, self.device)  # copy equal-length sequences at once
+        else:
+            ys = [np2tensor(y, self.device) for y in ys]  # <eos> is included
+            ys = pad_list(ys, self.pad)
         ys_in, ys_out = ys[:, :-1], ys[:, 1:]
 
         logits, out, new_state = self.decode(ys_in, state=state, mems=state)
@@ -69,6 +75,7 @@ class LMBase(ModelBase):
             logits = logits[:, -1].unsqueeze(1)
 
         # Compute XE sequence loss
+        logits_2d = None  # flattened once and shared with accuracy for adaptive softmax
         if n_caches > 0 and len(self.cache_ids) > 0:
             assert ys_out.size(1) == 1
             assert ys_out.size(0) == 1
@@ -102,8 +109,8 @@ class LMBase(ModelBase):
                                               self.lsm_prob, self.pad, self.training,
                                               normalize_length=True)
             else:
-                loss = self.adaptive_softmax(logits.reshape((-1, logits.size(2))),
-                                             ys_out.contiguous().view(-1)).loss
+                logits_2d = logits.reshape((-1, logits.size(2)))  # `[B * L, n_units]`
+                loss = self.adaptive_softmax(logits_2d, ys_out.reshape(-1)).loss
                 ppl = np.exp(loss.item())
 
         if n_caches > 0:
@@ -115,8 +122,9 @@ class LMBase(ModelBase):
         if self.adaptive_softmax is None:
             acc = compute_accuracy(logits, ys_out, pad=self.pad)
         else:
-            acc = compute_accuracy(self.adaptive_softmax.log_prob(
-                logits.reshape((-1, logits.size(2)))), ys_out, pad=self.pad)
+            if logits_2d is None:
+                logits_2d = logits.reshape((-1, logits.size(2)))
+            acc = compute_accuracy(self.adaptive_softmax.log_prob(logits_2d), ys_out, pad=self.pad)
 
         observation = {'loss.lm': loss.item(), 'acc.lm': acc, 'ppl.lm': ppl}
         return loss, new_state, observation
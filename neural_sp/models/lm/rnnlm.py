@@ -4,6 +4,7 @@
 """Recurrent neural network language model (RNNLM)."""
 
 from distutils.util import strtobool
+from distutils.version import LooseVersion
 import logging
 import torch
 import torch.nn as nn
@@ -14,6 +15,9 @@ from neural_sp.models.torch_utils import repeat
 
 logger = logging.getLogger(__name__)
 
+# NOTE: DataParallel marks replicas with `_is_replica` since torch 1.5
+torch_15_plus = LooseVersion(torch.__version__) >= LooseVersion("1.5")
+
 
 class RNNLM(LMBase):
     """RNN language model."""
@@ -191,7 +195,11 @@ class RNNLM(LMBase):
         residual = None
         new_hxs, new_cxs = [], []
         for lth in range(self.n_layers):
-            self.rnn[lth].flatten_parameters()  # for multi-GPUs
+            if not torch_15_plus or getattr(self.rnn[lth], '_is_replica', False):
+                # NOTE: weights broadcast by DataParallel are not contiguous.
+                # Otherwise, they have been already flattened by .cuda().
+                # Replicas cannot be told apart in older versions.
+                self.rnn[lth].flatten_parameters()  # for multi-GPUs
 
             # Path through RNN
             ys_emb, (h, c) = self.rnn[lth](ys_emb, hx=(state['hxs'][lth:lth + 1],
@@ -10,6 +10,8 @@ import torch
 import torch.nn as nn
 
 from neural_sp.models.modules.headdrop import headdrop
+from neural_sp.models.torch_utils import merge_linear_state_dict
+from neural_sp.models.torch_utils import sliced_linear
 
 logger = logging.getLogger(__name__)
 
@@ -49,37 +51,61 @@ class MultiheadAttentionMechanism(nn.Module):
         self.dropout_attn = nn.Dropout(p=dropout)
         self.dropout_head = dropout_head
 
-        if atype == 'scaled_dot':
-            # for Transformer
-            self.w_key = nn.Linear(kdim, adim, bias=bias)
-            self.w_value = nn.Linear(kdim, adim, bias=bias)
+        if atype not in ['scaled_dot', 'add']:
+            raise NotImplementedError(atype)
+
+        # NOTE: projections are stacked in a single layer so that those sharing
+        # the same input are computed with a single matmul
+        self.fused_qkv = kdim == qdim
+        if self.fused_qkv:
+            self.w_qkv = nn.Linear(kdim, adim * 3, bias=bias)  # query, key, value
+        else:
             self.w_query = nn.Linear(qdim, adim, bias=bias)
-        elif atype == 'add':
+            self.w_kv = nn.Linear(kdim, adim * 2, bias=bias)  # key, value
+        if atype == 'add':
             # for LAS
-            self.w_key = nn.Linear(kdim, adim, bias=bias)
-            self.w_value = nn.Linear(kdim, adim, bias=bias)
-            self.w_query = nn.Linear(qdim, adim, bias=bias)
             self.v = nn.Linear(adim, n_heads, bias=bias)
-        else:
-            raise NotImplementedError(atype)
 
         self.w_out = nn.Linear(adim, odim, bias=bias)
 
         if param_init == 'xavier_uniform':
             self.reset_parameters(bias)
 
+    def merge_projections(self, state_dict, prefix):
+        """Concatenate separate w_query/w_key/w_value in state_dict into the stacked projections.
+
+        Args:
+            state_dict (dict): state dict to be loaded
+            prefix (str): prefix of this module in state_dict
+
+        """
+        if self.fused_qkv:
+            merge_linear_state_dict(state_dict, prefix, ['w_query', 'w_key', 'w_value'], 'w_qkv')
+        else:
+            merge_linear_state_dict(state_dict, prefix, ['w_key', 'w_value'], 'w_kv')
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # for checkpoints with separate w_query/w_key/w_value
+        self.merge_projections(state_dict, prefix)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
     def reset_parameters(self, bias):
         """Initialize parameters with Xavier uniform distribution."""
         logger.info('===== Initialize %s with Xavier uniform distribution =====' %
                     self.__class__.__name__)
         # NOTE: see https://github.com/pytorch/fairseq/blob/master/fairseq/modules/multihead_attention.py
-        nn.init.xavier_uniform_(self.w_key.weight, gain=1 / math.sqrt(2))
-        nn.init.xavier_uniform_(self.w_value.weight, gain=1 / math.sqrt(2))
-        nn.init.xavier_uniform_(self.w_query.weight, gain=1 / math.sqrt(2))
+        # NOTE: stacked projections are initialized separately
+        adim = self.n_heads * self.d_k
+        if self.fused_qkv:
+            for i in range(3):  # query, key, value
+                nn.init.xavier_uniform_(self.w_qkv.weight[adim * i:adim * (i + 1)], gain=1 / math.sqrt(2))
+        else:
+            nn.init.xavier_uniform_(self.w_query.weight, gain=1 / math.sqrt(2))
+            for i in range(2):  # key, value
+                nn.init.xavier_uniform_(self.w_kv.weight[adim * i:adim * (i + 1)], gain=1 / math.sqrt(2))
         if bias:
-            nn.init.constant_(self.w_key.bias, 0.)
-            nn.init.constant_(self.w_value.bias, 0.)
-            nn.init.constant_(self.w_query.bias, 0.)
+            for proj in [self.w_qkv] if self.fused_qkv else [self.w_query, self.w_kv]:
+                nn.init.constant_(proj.bias, 0.)
 
         nn.init.xavier_uniform_(self.w_out.weight)
         if bias:
@@ -116,9 +142,26 @@ class MultiheadAttentionMechanism(nn.Module):
         attn_state = {}
 
         # Pre-computation of encoder-side features for computing scores
+        adim = self.n_heads * self.d_k
+        q = None
         if self.key is None or not cache:
-            self.key = self.w_key(key).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
-            self.value = self.w_value(value).view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
+            # NOTE: projections sharing the same input are computed with a single matmul
+            if self.fused_qkv:
+                if key is value and query is key:
+                    q, k, v = self.w_qkv(key).split(adim, dim=-1)
+                elif key is value:
+                    k, v = sliced_linear(key, self.w_qkv, adim, adim * 3).split(adim, dim=-1)
+                else:
+                    k = sliced_linear(key, self.w_qkv, adim, adim * 2)
+                    v = sliced_linear(value, self.w_qkv, adim * 2, adim * 3)
+            else:
+                if key is value:
+                    k, v = self.w_kv(key).split(adim, dim=-1)
+                else:
+                    k = sliced_linear(key, self.w_kv, 0, adim)
+                    v = sliced_linear(value, self.w_kv, adim, adim * 2)
+            self.key = k.view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
+            self.value = v.view(bs, -1, self.n_heads, self.d_k)  # `[B, klen, H, d_k]`
             if mask is not None:
                 self.mask = mask.unsqueeze(3).repeat([1, 1, 1, self.n_heads])
                 mask_size = (bs, qlen, klen, self.n_heads)
@@ -127,7 +170,14 @@ class MultiheadAttentionMechanism(nn.Module):
                 self.mask = None
 
         key = self.key
-        query = self.w_query(query).view(bs, -1, self.n_heads, self.d_k)  # `[B, qlen, H, d_k]`
+        if q is None:
+            if self.fused_qkv:
+                q = sliced_linear(query.contiguous(), self.w_qkv, 0, adim)
+            else:
+                q = self.w_query(query.contiguous())
+            # NOTE: a sliced query (e.g., incremental decoding) is made contiguous
+            # so that the projection is dispatched to a single addmm
+        query = q.view(bs, -1, self.n_heads, self.d_k)  # `[B, qlen, H, d_k]`
 
         if self.atype == 'scaled_dot':
             e = torch.einsum("bihd,bjhd->bijh", (query, key)) / self.scale
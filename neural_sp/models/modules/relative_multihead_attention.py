@@ -11,6 +11,8 @@ import torch
 import torch.nn as nn
 
 from neural_sp.models.modules.headdrop import headdrop
+from neural_sp.models.torch_utils import merge_linear_state_dict
+from neural_sp.models.torch_utils import sliced_linear
 
 
 logger = logging.getLogger(__name__)
@@ -54,9 +56,9 @@ class RelativeMultiheadAttentionMechanism(nn.Module):
 
         assert kdim == qdim
         # NOTE: relative attention is supprted for self-attention only
-        self.w_key = nn.Linear(kdim, adim, bias=bias)
-        self.w_value = nn.Linear(kdim, adim, bias=bias)
-        self.w_query = nn.Linear(qdim, adim, bias=bias)
+        # NOTE: projections are stacked in a single layer so that those sharing
+        # the same input are computed with a single matmul
+        self.w_qkv = nn.Linear(kdim, adim * 3, bias=bias)  # query, key, value
         self.w_out = nn.Linear(adim, odim, bias=bias)
 
         if xl_like:
@@ -67,18 +69,32 @@ class RelativeMultiheadAttentionMechanism(nn.Module):
         else:
             logger.info('Parameter initialization is skipped.')
 
+    def merge_projections(self, state_dict, prefix):
+        """Concatenate separate w_query/w_key/w_value in state_dict into the stacked projection.
+
+        Args:
+            state_dict (dict): state dict to be loaded
+            prefix (str): prefix of this module in state_dict
+
+        """
+        merge_linear_state_dict(state_dict, prefix, ['w_query', 'w_key', 'w_value'], 'w_qkv')
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # for checkpoints with separate w_query/w_key/w_value
+        self.merge_projections(state_dict, prefix)
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
     def reset_parameters(self, bias):
         """Initialize parameters with Xavier uniform distribution."""
         logger.info('===== Initialize %s with Xavier uniform distribution =====' %
                     self.__class__.__name__)
         # NOTE: see https://github.com/pytorch/fairseq/blob/master/fairseq/modules/multihead_attention.py
-        nn.init.xavier_uniform_(self.w_key.weight, gain=1 / math.sqrt(2))
-        nn.init.xavier_uniform_(self.w_value.weight, gain=1 / math.sqrt(2))
-        nn.init.xavier_uniform_(self.w_query.weight, gain=1 / math.sqrt(2))
+        # NOTE: stacked projections are initialized separately
+        adim = self.n_heads * self.d_k
+        for i in range(3):  # query, key, value
+            nn.init.xavier_uniform_(self.w_qkv.weight[adim * i:adim * (i + 1)], gain=1 / math.sqrt(2))
         if bias:
-            nn.init.constant_(self.w_key.bias, 0.)
-            nn.init.constant_(self.w_value.bias, 0.)
-            nn.init.constant_(self.w_query.bias, 0.)
+            nn.init.constant_(self.w_qkv.bias, 0.)
 
         nn.init.xavier_uniform_(self.w_out.weight)
         if bias:
@@ -166,14 +182,23 @@ class RelativeMultiheadAttentionMechanism(nn.Module):
             assert mask.size() == (bs, qlen, mlen + qlen, self.n_heads), \
                 (mask.size(), (bs, qlen, mlen + qlen, self.n_heads))
 
-        k = self.w_key(key).view(bs, -1, self.n_heads, self.d_k)  # `[B, mlen+qlen, H, d_k]`
-        v = self.w_value(key).view(bs, -1, self.n_heads, self.d_k)  # `[B, mlen+qlen, H, d_k]`
-        q = self.w_query(key[:, -qlen:]).view(bs, -1, self.n_heads, self.d_k)  # `[B, qlen, H, d_k]`
+        # NOTE: projections sharing the same input are computed with a single matmul
+        adim = self.n_heads * self.d_k
+        if mlen == 0:
+            q, k, v = self.w_qkv(key).split(adim, dim=-1)
+        else:
+            k, v = sliced_linear(key, self.w_qkv, adim, adim * 3).split(adim, dim=-1)
+            q = sliced_linear(key[:, -qlen:].contiguous(), self.w_qkv, 0, adim)
+            # NOTE: the sliced query is made contiguous so that the projection
+            # is dispatched to a single addmm
+        k = k.view(bs, -1, self.n_heads, self.d_k)  # `[B, mlen+qlen, H, d_k]`
+        v = v.view(bs, -1, self.n_heads, self.d_k)  # `[B, mlen+qlen, H, d_k]`
+        q = q.view(bs, -1, self.n_heads, self.d_k)  # `[B, qlen, H, d_k]`
 
         if self.xl_like:
             _pos_embs = self.w_pos(pos_embs)
         else:
-            _pos_embs = self.w_value(pos_embs)  # NOTE: this is not w_value
+            _pos_embs = sliced_linear(pos_embs, self.w_qkv, adim * 2, adim * 3)  # NOTE: this is not w_value
         _pos_embs = _pos_embs.view(-1, self.n_heads, self.d_k)  # `[mlen+qlen, H, d_k]`
 
         # content-based attention term: (a) + (c)
@@ -77,6 +77,42 @@ def pad_list(xs, pad_value=0., pad_left=False):
     return xs_pad
 
 
+def sliced_linear(xs, linear, start, end):
+    """Apply a part of a linear layer whose outputs stack several projections.
+
+    Args:
+        xs (FloatTensor): `[*, idim]`
+        linear (nn.Linear): layer whose output dimensions are stacked projections
+        start (int): first output dimension of the projection
+        end (int): last output dimension of the projection (exclusive)
+    Returns:
+        out (FloatTensor): `[*, end - start]`
+
+    """
+    # NOTE: slicing rows of the weight does not copy it
+    bias = linear.bias[start:end] if linear.bias is not None else None
+    return torch.nn.functional.linear(xs, linear.weight[start:end], bias)
+
+
+def merge_linear_state_dict(state_dict, prefix, names, name_fused):
+    """Concatenate parameters of separate linear layers into a fused one in place.
+
+    This is used to load checkpoints saved before the projections were fused.
+
+    Args:
+        state_dict (dict): state dict to be loaded
+        prefix (str): prefix of the module in state_dict
+        names (List): names of the separate linear layers in the stacking order
+        name_fused (str): name of the fused linear layer
+
+    """
+    for param_name in ['weight', 'bias']:
+        keys = [prefix + n + '.' + param_name for n in names]
+        if all(k in state_dict for k in keys):
+            state_dict[prefix + name_fused + '.' + param_name] = torch.cat(
+                [state_dict.pop(k) for k in keys], dim=0)
+
+
 def make_pad_mask(seq_lens):
     """Make mask for padding.
 
@@ -3,6 +3,7 @@
 
 """Select optimizer."""
 
+from distutils.version import LooseVersion
 import logging
 import torch
 
@@ -27,24 +28,33 @@ def set_optimizer(model, optimizer, lr, weight_decay=0.):
     for n in [n for n, p in model.named_parameters() if not p.requires_grad]:
         logger.info("%s" % n)
 
+    # NOTE: update all parameters with multi-tensor (foreach) kernels
+    # instead of a per-parameter Python loop
+    kwargs = {}
+    if LooseVersion(torch.__version__) >= LooseVersion("1.12.0"):
+        kwargs['foreach'] = True
+
     if optimizer == 'sgd':
         opt = torch.optim.SGD(parameters,
                               lr=lr,
                               weight_decay=weight_decay,
-                              nesterov=False)
+                              nesterov=False,
+                              **kwargs)
     elif optimizer == 'momentum':
         opt = torch.optim.SGD(parameters,
                               lr=lr,
                               momentum=0.9,
                               weight_decay=weight_decay,
-                              nesterov=False)
+                              nesterov=False,
+                              **kwargs)
     elif optimizer == 'nesterov':
         opt = torch.optim.SGD(parameters,
                               lr=lr,
                               #  momentum=0.9,
                               momentum=0.99,
                               weight_decay=weight_decay,
-                              nesterov=True)
+                              nesterov=True,
+                              **kwargs)
     elif optimizer == 'adadelta':
         opt = torch.optim.Adadelta(parameters,
                                    rho=0.9,  # pytorch default
@@ -52,29 +62,34 @@ def set_optimizer(model, optimizer, lr, weight_decay=0.):
                                    # eps=1e-8,  # pytorch default
                                    # eps=1e-6,  # chainer default
                                    eps=lr,
-                                   weight_decay=weight_decay)
+                                   weight_decay=weight_decay,
+                                   **kwargs)
 
     elif optimizer == 'adam':
         opt = torch.optim.Adam(parameters,
                                lr=lr,
-                               weight_decay=weight_decay)
+                               weight_decay=weight_decay,
+                               **kwargs)
 
     elif optimizer == 'noam':
         opt = torch.optim.Adam(parameters,
                                lr=0,
                                betas=(0.9, 0.98),
                                eps=1e-09,
-                               weight_decay=weight_decay)
+                               weight_decay=weight_decay,
+                               **kwargs)
 
     elif optimizer == 'adagrad':
         opt = torch.optim.Adagrad(parameters,
                                   lr=lr,
-                                  weight_decay=weight_decay)
+                                  weight_decay=weight_decay,
+                                  **kwargs)
 
     elif optimizer == 'rmsprop':
         opt = torch.optim.RMSprop(parameters,
                                   lr=lr,
-                                  weight_decay=weight_decay)
+                                  weight_decay=weight_decay,
+                                  **kwargs)
 
     else:
         raise NotImplementedError(optimizer)
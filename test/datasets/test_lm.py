@@ -0,0 +1,57 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for LM dataset."""
+
+import importlib
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+
+def make_tsv(tsv_path, n_utts=50, vocab=20):
+    rows = []
+    for i in range(n_utts):
+        token_id = np.random.randint(3, vocab, np.random.randint(1, 10))
+        rows.append(dict(utt_id='utt_%04d' % i, speaker='spk', feat_path=None,
+                         xlen=0, xdim=0, text=' '.join(['w%d' % t for t in token_id]),
+                         token_id=' '.join(map(str, token_id)), ylen=len(token_id), ydim=vocab))
+    pd.DataFrame(rows).to_csv(tsv_path, sep='\t', index=False)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason='CUDA is not available')
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_cuda_prefetcher(tmp_path, batch_size):
+    tsv_path = str(tmp_path / 'train.tsv')
+    make_tsv(tsv_path)
+
+    module = importlib.import_module('neural_sp.datasets.lm')
+    dataset_ref = module.Dataset(tsv_path, batch_size=batch_size, bptt=8)
+    dataset = module.Dataset(tsv_path, batch_size=batch_size, bptt=8)
+    prefetcher = module.CUDAPrefetcher(dataset, 0)
+    assert len(prefetcher) == len(dataset_ref)
+    assert prefetcher.epoch_detail == dataset_ref.epoch_detail
+
+    n_epochs = 0
+    while n_epochs < 2:
+        ys_ref, is_new_epoch_ref = dataset_ref.next()
+        ys, is_new_epoch = prefetcher.next()
+        assert ys.is_cuda
+        assert np.array_equal(ys.cpu().numpy(), ys_ref)
+        assert is_new_epoch == is_new_epoch_ref
+        assert prefetcher.epoch_detail == dataset_ref.epoch_detail
+
+        if is_new_epoch:
+            n_epochs += 1
+            # nothing is prefetched from the next epoch
+            assert prefetcher.next_batch is None
+            assert dataset.offset == 0
+            assert dataset.epoch == dataset_ref.epoch
+        else:
+            # only the next mini-batch is prefetched
+            assert prefetcher.next_batch is not None
+            if prefetcher.next_batch[1]:
+                assert dataset.offset == 0  # reset after the last mini-batch
+            else:
+                assert dataset.offset == dataset_ref.offset + 8
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for edit distance."""
+
+import pytest
+
+from neural_sp.evaluators.edit_distance import compute_wer
+
+
+@pytest.mark.parametrize(
+    "ref, hyp, results",
+    [
+        ('a b c', 'a b c', (0, 0, 0, 0)),
+        ('a b c', 'a x c', (100, 100, 0, 0)),
+        ('a b c', 'a b c d', (100, 0, 100, 0)),
+        ('a b c', 'a c', (100, 0, 0, 100)),
+        ('a b c', 'x y', (300, 200, 0, 100)),
+        ('a b', 'x a y b z', (300, 0, 300, 0)),
+        ('a b c d', 'b c e', (200, 100, 0, 100)),
+    ]
+)
+def test_compute_wer(ref, hyp, results):
+    assert compute_wer(ref.split(' '), hyp.split(' ')) == results
+
+
+def test_compute_wer_empty():
+    assert compute_wer([], ['a', 'b']) == (200, 0, 200, 0)
+    assert compute_wer(['a', 'b'], []) == (200, 0, 0, 200)
+    assert compute_wer([], []) == (0, 0, 0, 0)
+
+
+def test_compute_wer_normalize():
+    wer, n_sub, n_ins, n_del = compute_wer(list('abcd'), list('abxd'), normalize=True)
+    assert wer == pytest.approx(25.)
+    assert (n_sub, n_ins, n_del) == (100, 0, 0)
+
+
+def test_count_edit_ops_numba():
+    pytest.importorskip('numba')
+    import numpy as np
+    import random
+
+    from neural_sp.evaluators.edit_distance import _count_edit_ops
+    from neural_sp.evaluators.edit_distance import _count_edit_ops_nb
+
+    rng = random.Random(0)
+    for _ in range(200):
+        ref = [rng.randint(0, 5) for _ in range(rng.randint(0, 20))]
+        hyp = [rng.randint(0, 5) for _ in range(rng.randint(0, 20))]
+        d = [[0] * (len(hyp) + 1) for _ in range(len(ref) + 1)]
+        d_nb = np.zeros((len(ref) + 1, len(hyp) + 1), dtype=np.int32)
+        results = _count_edit_ops(ref, hyp, d)
+        results_nb = _count_edit_ops_nb(np.array(ref, dtype=np.int32), np.array(hyp, dtype=np.int32), d_nb)
+        assert tuple(int(v) for v in results_nb) == results
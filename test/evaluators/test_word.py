@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Test for word-level evaluation."""
+
+import importlib
+import logging
+import multiprocessing
+import numpy as np
+import os
+import pytest
+import random
+
+
+VOCAB = ['<blank>', '<unk>', '<eos>', 'a', 'b', 'c', 'd']
+CHARS = ['<blank>', '<unk>', '<eos>', ' ', 'x', 'y', 'z']
+
+
+class Idx2token(object):
+
+    def __init__(self, vocab, separator):
+        self.vocab = vocab
+        self.separator = separator
+
+    def __call__(self, token_ids):
+        return self.separator.join([self.vocab[i] for i in token_ids])
+
+
+class BatchedIdx2token(Idx2token):
+    """Converter supporting only the batched form."""
+
+    batched = True
+
+    def __call__(self, token_ids_list):
+        assert all(isinstance(token_ids, list) for token_ids in token_ids_list)
+        return [super(BatchedIdx2token, self).__call__(token_ids) for token_ids in token_ids_list]
+
+
+class FakeModel(object):
+    """Model whose outputs only depend on the utterance index stored in xs."""
+
+    save_path = None
+    subsample = [2, 2]
+    enc_n_layers_sub1 = 2
+
+    def decode(self, xs, params, idx2token=None, exclude_eos=False,
+               refs_id=None, utt_ids=None, speakers=None, task='ys',
+               ensemble_models=[], teacher_force=False):
+        hyps, aws = [], []
+        for x in xs:
+            rng = random.Random(int(x[0, 0]) * 2 + int(task == 'ys_sub1'))
+            xlen = x.shape[0]
+            if task == 'ys_sub1':
+                # characters are emitted at twice the frame rate of words
+                hyp = [rng.randint(3, 6) for _ in range(rng.randint(1, 8))]
+                hyps.append(hyp)
+                aws.append(np.array([[rng.random() for _ in range(xlen * 2)] for _ in hyp]))
+            else:
+                nbest = [[rng.randint(1, 6) for _ in range(rng.randint(1, 6))]
+                         for _ in range(params['recog_beam_width'])]
+                hyps.append(nbest)
+                if idx2token is not None:
+                    idx2token(nbest[0])  # decoders convert one sequence at a time (e.g., for logging)
+                aws.append(np.array([[rng.random() for _ in range(xlen)] for _ in nbest[0]]))
+        return hyps, aws
+
+
+class FakeDataloader(object):
+
+    def __init__(self, n_utts, seed=0):
+        self.set = 'dev'
+        self.corpus = 'test'
+        self.idx2token = [Idx2token(VOCAB, ' '), Idx2token(CHARS, '')]
+        self.batch_size = 1
+        rng = random.Random(seed)
+        self.texts = [' '.join([rng.choice(VOCAB[3:]) for _ in range(rng.randint(1, 6))])
+                      for _ in range(n_utts)]
+        self.xlens = [rng.randint(5, 500) for _ in range(n_utts)]
+
+    def reset(self, batch_size=None, batch_size_type=None, is_new_epoch=False):
+        if batch_size is not None:
+            self.batch_size = batch_size
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        for offset in range(0, len(self.texts), self.batch_size):
+            utt_indices = range(offset, min(offset + self.batch_size, len(self.texts)))
+            yield {
+                'xs': [np.full((4, 2), i) for i in utt_indices],
+                'xlens': np.array([self.xlens[i] for i in utt_indices]),
+                'ys': [[3] for _ in utt_indices],
+                'ys_sub1': [[4] for _ in utt_indices],
+                'text': [self.texts[i] for i in utt_indices],
+                'utt_ids': ['utt%03d' % i for i in utt_indices],
+                'speakers': ['spk%d' % (i % 3) for i in utt_indices],
+            }
+
+
+def make_params(**kwargs):
+    params = dict(
+        recog_batch_size=1,
+        recog_beam_width=4,
+        recog_resolving_unk=False,
+        recog_block_sync=False,
+        recog_n_jobs=1,
+        recog_lm_weight=0.,
+    )
+    params.update(kwargs)
+    return params
+
+
+def run_eval_word(save_dir, caplog, dataloader, oracle=False, **kwargs):
+    module = importlib.import_module('neural_sp.evaluators.word')
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger=module.logger.name):
+        wer, cer, n_oov = module.eval_word([FakeModel()], dataloader, make_params(**kwargs),
+                                           save_dir=str(save_dir), oracle=oracle, fine_grained=True)
+    logs = [r.getMessage() for r in caplog.records if r.name == module.logger.name]
+    with open(os.path.join(str(save_dir), 'hyp.trn')) as f:
+        hyp_trn = f.read()
+    return (wer, cer, n_oov), logs, hyp_trn
+
+
+@pytest.mark.parametrize("batch_size", [2, 5])
+@pytest.mark.parametrize("resolving_unk", [False, True])
+def test_eval_word_batch_size(tmp_path, caplog, batch_size, resolving_unk):
+    dataloader = FakeDataloader(n_utts=17)
+    results_ref, logs_ref, hyp_trn_ref = run_eval_word(
+        tmp_path / 'bs1', caplog, dataloader, oracle=True,
+        recog_batch_size=1, recog_resolving_unk=resolving_unk)
+    results, logs, hyp_trn = run_eval_word(
+        tmp_path / 'bs', caplog, dataloader, oracle=True,
+        recog_batch_size=batch_size, recog_resolving_unk=resolving_unk)
+
+    assert results == pytest.approx(results_ref)
+    assert logs == logs_ref
+    assert hyp_trn == hyp_trn_ref
+    if resolving_unk:
+        assert results[2] > 0  # OOV resolution is exercised
+        assert '<unk>' not in hyp_trn
+
+    hit_rates = [float(m.split(': ')[1].split(' ')[0]) for m in logs if m.startswith('Oracle hit rate')]
+    assert len(hit_rates) == 1
+    assert 0 <= hit_rates[0] <= 100
+
+
+@pytest.mark.parametrize("batch_size", [1, 4])
+def test_eval_word_n_jobs(tmp_path, caplog, batch_size):
+    dataloader = FakeDataloader(n_utts=13)
+    results_ref, logs_ref, hyp_trn_ref = run_eval_word(
+        tmp_path / 'serial', caplog, dataloader, oracle=True,
+        recog_batch_size=batch_size, recog_n_jobs=1)
+    results, logs, hyp_trn = run_eval_word(
+        tmp_path / 'parallel', caplog, dataloader, oracle=True,
+        recog_batch_size=batch_size, recog_n_jobs=2)
+
+    assert results == pytest.approx(results_ref)
+    assert logs == logs_ref
+    assert hyp_trn == hyp_trn_ref
+
+
+def test_eval_word_n_jobs_error(tmp_path):
+    class BrokenModel(FakeModel):
+
+        def decode(self, xs, params, **kwargs):
+            if int(xs[0][0, 0]) >= 4:
+                raise RuntimeError('decoding failed')
+            return super().decode(xs, params, **kwargs)
+
+    module = importlib.import_module('neural_sp.evaluators.word')
+    with pytest.raises(RuntimeError):
+        module.eval_word([BrokenModel()], FakeDataloader(n_utts=8), make_params(recog_batch_size=2, recog_n_jobs=2),
+                         save_dir=str(tmp_path))
+    # worker processes are shut down even if decoding fails
+    assert len(multiprocessing.active_children()) == 0
+
+
+
+def test_eval_word_n_jobs_pending(tmp_path, caplog, monkeypatch):
+    class Future(object):
+
+        def __init__(self, executor, results):
+            self.executor = executor
+            self.results = results
+            executor.n_pending += 1
+
+        def result(self):
+            self.executor.n_pending -= 1
+            return self.results
+
+    class SerialExecutor(object):
+        """Record the number of mini-batches whose results are not consumed yet."""
+
+        def __init__(self, max_workers, mp_context):
+            self.n_pending = 0
+            self.n_pending_max = 0
+
+        def __enter__(self):
+            executors.append(self)
+            return self
+
+        def __exit__(self, *args):
+            return False
+
+        def submit(self, fn, *args):
+            future = Future(self, fn(*args))
+            self.n_pending_max = max(self.n_pending_max, self.n_pending)
+            return future
+
+    executors = []
+    dataloader = FakeDataloader(n_utts=20)
+    results_ref, _, _ = run_eval_word(tmp_path / 'serial', caplog, dataloader, recog_n_jobs=1)
+    module = importlib.import_module('neural_sp.evaluators.word')
+    monkeypatch.setattr(module, 'ProcessPoolExecutor', SerialExecutor)
+    results, _, _ = run_eval_word(tmp_path / 'parallel', caplog, dataloader, recog_n_jobs=2)
+
+    assert results == pytest.approx(results_ref)
+    assert len(executors) == 1
+    assert executors[0].n_pending == 0
+    assert executors[0].n_pending_max == 2 * 2 + 1
+
+
+@pytest.mark.parametrize("oracle", [False, True])
+def test_eval_word_batched_idx2token(tmp_path, caplog, oracle):
+    dataloader = FakeDataloader(n_utts=11)
+    results_ref, logs_ref, hyp_trn_ref = run_eval_word(
+        tmp_path / 'ref', caplog, dataloader, oracle=oracle,
+        recog_batch_size=3, recog_resolving_unk=True)
+    dataloader.idx2token[0] = BatchedIdx2token(VOCAB, ' ')
+    results, logs, hyp_trn = run_eval_word(
+        tmp_path / 'batched', caplog, dataloader, oracle=oracle,
+        recog_batch_size=3, recog_resolving_unk=True)
+
+    assert results == pytest.approx(results_ref)
+    assert logs == logs_ref
+    assert hyp_trn == hyp_trn_ref
@@ -4,9 +4,11 @@
 """Test for Transformer-XL LM."""
 
 import argparse
+import copy
 import importlib
 import numpy as np
 import pytest
+import torch
 
 
 VOCAB = 100  # large for adaptive softmax
@@ -80,3 +82,29 @@ def test_forward(args):
     # assert loss.size(0) == 1
     assert loss.item() >= 0
     assert isinstance(observation, dict)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available() or not hasattr(torch, 'compile'),
+                    reason='requires CUDA and torch.compile')
+def test_compile_decode():
+    args = make_args(dropout_in=0., dropout_hidden=0., dropout_att=0.)
+
+    ys = [np.random.randint(0, VOCAB, 20).astype(np.int64) for _ in range(4)]
+    device = "cuda"
+
+    module = importlib.import_module('neural_sp.models.lm.transformer_xl')
+    lm = module.TransformerXL(args)
+    lm = lm.to(device)
+    lm_compiled = copy.deepcopy(lm)
+    lm_compiled.decode = torch.compile(lm_compiled.decode, dynamic=False)
+
+    # carry the state over mini-batches as in training
+    state, state_compiled = None, None
+    for _ in range(3):
+        loss, state, _ = lm(ys, state=state)
+        loss_compiled, state_compiled, _ = lm_compiled(ys, state=state_compiled)
+        assert torch.allclose(loss, loss_compiled, atol=1e-4)
+        loss.backward()
+        loss_compiled.backward()
+        state = lm.repackage_state(state)
+        state_compiled = lm_compiled.repackage_state(state_compiled)
@@ -64,3 +64,161 @@ def test_forward(args):
         assert cv.size() == (batch_size, 1, value.size(2))
         assert aws.size() == (batch_size, args['n_heads'], 1, klen)
         assert isinstance(attn_state, dict)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'n_heads': 4}),
+        ({'n_heads': 4, 'atype': 'add'}),
+        ({'bias': False}),
+    ]
+)
+def test_fused_projection(args):
+    args = make_args(**args)
+    args['dropout'] = 0.
+
+    batch_size = 4
+    klen = 40
+    device = "cpu"
+
+    xs = torch.randn(batch_size, klen, args['kdim'], device=device)
+    src_mask = torch.ones(batch_size, klen, klen, device=device).byte()
+
+    module = importlib.import_module('neural_sp.models.modules.multihead_attention')
+    attention = module.MultiheadAttentionMechanism(**args)
+    attention = attention.to(device)
+    attention.eval()
+
+    # self-attention (fused Q/K/V) vs. separate projections
+    cv_fused, aws_fused, _ = attention(xs, xs, xs, mask=src_mask)
+    cv, aws, _ = attention(xs.clone(), xs.clone(), xs, mask=src_mask)
+    assert torch.allclose(cv_fused, cv, atol=1e-6)
+    assert torch.allclose(aws_fused, aws, atol=1e-6)
+
+    # source-target attention (fused K/V)
+    query = torch.randn(batch_size, 5, args['qdim'], device=device)
+    cv_fused = attention(xs, xs, query, mask=None)[0]
+    cv = attention(xs, xs.clone(), query, mask=None)[0]
+    assert torch.allclose(cv_fused, cv, atol=1e-6)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'n_heads': 4}),
+        ({'n_heads': 4, 'atype': 'add'}),
+        ({'bias': False}),
+        ({'qdim': 24}),
+    ]
+)
+def test_load_separate_projections(args):
+    args = make_args(**args)
+    args['dropout'] = 0.
+
+    batch_size = 4
+    klen = 40
+    qlen = 5
+    device = "cpu"
+
+    key = torch.randn(batch_size, klen, args['kdim'], device=device)
+    query = torch.randn(batch_size, qlen, args['qdim'], device=device)
+
+    module = importlib.import_module('neural_sp.models.modules.multihead_attention')
+    attention = module.MultiheadAttentionMechanism(**args)
+    attention.eval()
+
+    # checkpoint saved with separate projections
+    state_dict = attention.state_dict()
+    names = ['w_query', 'w_key', 'w_value'] if attention.fused_qkv else ['w_key', 'w_value']
+    name_fused = 'w_qkv' if attention.fused_qkv else 'w_kv'
+    for param_name in ['weight', 'bias'] if args['bias'] else ['weight']:
+        params = state_dict.pop(name_fused + '.' + param_name).chunk(len(names), dim=0)
+        for n, p in zip(names, params):
+            state_dict[n + '.' + param_name] = p.clone()
+
+    attention_loaded = module.MultiheadAttentionMechanism(**args)
+    attention_loaded.load_state_dict(state_dict)
+    attention_loaded.eval()
+
+    cv, aws, _ = attention(key, key, query, mask=None)
+    cv_loaded, aws_loaded, _ = attention_loaded(key, key, query, mask=None)
+    assert torch.equal(cv, cv_loaded)
+    assert torch.equal(aws, aws_loaded)
+
+    # separate projections computed by hand
+    k = torch.nn.functional.linear(key, state_dict['w_key.weight'], state_dict.get('w_key.bias'))
+    if attention.fused_qkv:
+        q = torch.nn.functional.linear(query, state_dict['w_query.weight'], state_dict.get('w_query.bias'))
+    else:
+        q = attention.w_query(query)
+    if args['atype'] == 'scaled_dot':
+        d_k = args['adim'] // args['n_heads']
+        e = torch.einsum("bihd,bjhd->bijh", (q.view(batch_size, qlen, -1, d_k),
+                                             k.view(batch_size, klen, -1, d_k))) / attention.scale
+        assert torch.allclose(aws, torch.softmax(e, dim=2).permute(0, 3, 1, 2), atol=1e-6)
+
+
+class SeparateProjections(torch.nn.Module):
+    """Parameter layout of checkpoints saved before projections were stacked."""
+
+    def __init__(self, kdim, qdim, adim, odim, bias):
+        super().__init__()
+        self.w_key = torch.nn.Linear(kdim, adim, bias=bias)
+        self.w_value = torch.nn.Linear(kdim, adim, bias=bias)
+        self.w_query = torch.nn.Linear(qdim, adim, bias=bias)
+        self.w_out = torch.nn.Linear(adim, odim, bias=bias)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({}),
+        ({'bias': False}),
+        ({'qdim': 24}),
+    ]
+)
+def test_resume_separate_projections(args, tmp_path):
+    from neural_sp.bin.train_utils import load_checkpoint
+    from neural_sp.trainers.lr_scheduler import LRScheduler
+
+    args = make_args(**args)
+    torch.manual_seed(0)
+
+    def build(attention):
+        model = torch.nn.ModuleDict({'embed': torch.nn.Linear(8, 32), 'attn': attention})
+        optimizer = torch.optim.Adam(model.parameters(), lr=0.1)
+        scheduler = LRScheduler(optimizer, 0.1, decay_type='always',
+                                decay_start_epoch=1, decay_rate=0.5)
+        return model, scheduler
+
+    def step(model, scheduler, grads):
+        for n, p in model.named_parameters():
+            p.grad = grads[n].clone()
+        scheduler.optimizer.step()
+
+    # train with separate projections and save a checkpoint
+    model_old, scheduler_old = build(SeparateProjections(
+        args['kdim'], args['qdim'], args['adim'], args['odim'], args['bias']))
+    for _ in range(2):
+        step(model_old, scheduler_old, {n: torch.randn_like(p) for n, p in model_old.named_parameters()})
+    checkpoint_path = str(tmp_path / 'model.epoch-1')
+    torch.save({'model_state_dict': model_old.state_dict(),
+                'optimizer_state_dict': scheduler_old.get_state_dict()}, checkpoint_path)
+
+    # resume with stacked projections
+    module = importlib.import_module('neural_sp.models.modules.multihead_attention')
+    model, scheduler = build(module.MultiheadAttentionMechanism(**args))
+    load_checkpoint(checkpoint_path, model, scheduler)
+
+    # the next update must be the same as with separate projections
+    grads_old = {n: torch.randn_like(p) for n, p in model_old.named_parameters()}
+    grads = dict(grads_old)
+    model.attn.merge_projections(grads, 'attn.')
+    step(model_old, scheduler_old, grads_old)
+    step(model, scheduler, grads)
+
+    state_dict = model_old.state_dict()
+    model.attn.merge_projections(state_dict, 'attn.')
+    for n, p in model.state_dict().items():
+        assert torch.allclose(p, state_dict[n], atol=1e-6), n
@@ -103,3 +103,48 @@ def test_forward(args):
     assert cv.size() == cv_incremental.size()
     if not torch.allclose(cv, cv_incremental, equal_nan=True):
         warnings.warn("Incremental output did not match.", UserWarning)
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ({'bias': True}),
+        ({'bias': True, 'xl_like': True}),
+    ]
+)
+def test_load_separate_projections(args):
+    args = make_args(**args)
+    args['dropout'] = 0.
+
+    batch_size = 4
+    mlen = 20 if args['xl_like'] else 0
+    qlen = 5
+    device = "cpu"
+
+    cat = torch.randn(batch_size, mlen + qlen, args['kdim'], device=device)
+    query = cat[:, mlen:]
+    mask = torch.ones(batch_size, qlen, qlen + mlen, device=device).byte()
+
+    module_embedding = importlib.import_module('neural_sp.models.modules.positional_embedding')
+    pos_emb = module_embedding.XLPositionalEmbedding(args['kdim'], args['dropout'])
+    query, pos_embs = pos_emb(query, n_cache=mlen)
+
+    module_mha = importlib.import_module('neural_sp.models.modules.relative_multihead_attention')
+    attention = module_mha.RelativeMultiheadAttentionMechanism(**args)
+    attention.eval()
+
+    # checkpoint saved with separate projections
+    state_dict = attention.state_dict()
+    for param_name in ['weight', 'bias']:
+        params = state_dict.pop('w_qkv.' + param_name).chunk(3, dim=0)
+        for n, p in zip(['w_query', 'w_key', 'w_value'], params):
+            state_dict[n + '.' + param_name] = p.clone()
+
+    attention_loaded = module_mha.RelativeMultiheadAttentionMechanism(**args)
+    attention_loaded.load_state_dict(state_dict)
+    attention_loaded.eval()
+
+    cv, aws = attention(cat, query, pos_embs, mask)
+    cv_loaded, aws_loaded = attention_loaded(cat, query, pos_embs, mask)
+    assert torch.equal(cv, cv_loaded)
+    assert torch.equal(aws, aws_loaded)